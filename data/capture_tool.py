@@ -1,8 +1,11 @@
 import cv2
 import os
+import sys
 import time
 import subprocess
-import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.streams import MJPEGStream, decode_jpeg
 
 base_dir = "dataset"
 labels = ["left", "center", "right", "none"]
@@ -24,52 +27,39 @@ print("[L] Left | [C] Center | [R] Right | [N] None | [Q] Quit")
 
 process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=10**8)
 
-byte_buffer = b""
+stream = MJPEGStream(process.stdout)
 
 try:
     while True:
-        chunk = process.stdout.read(4096)
-        if not chunk:
+        jpg = stream.read(latest=True)
+        if jpg is None: break
+
+        frame = decode_jpeg(jpg)
+        if frame is None:
+            continue
+
+        cv2.imshow("Capture View", frame)
+
+        key = cv2.waitKey(1) & 0xFF
+
+        save_label = ""
+        if key == ord('l'):
+            save_label = "left"
+        elif key == ord('c'):
+            save_label = "center"
+        elif key == ord('r'):
+            save_label = "right"
+        elif key == ord('n'):
+            save_label = "none"
+        elif key == ord('q'):
             break
-        byte_buffer += chunk
-
-        a = byte_buffer.find(b'\xff\xd8')
-        b = byte_buffer.find(b'\xff\xd9')
-
-        if a != -1 and b != -1:
-            jpg = byte_buffer[a:b+2]
-            byte_buffer = byte_buffer[b+2:]
-
-            frame = cv2.imdecode(
-                np.frombuffer(jpg, dtype=np.uint8),
-                cv2.IMREAD_COLOR
-            )
-
-            if frame is None:
-                continue
-
-            cv2.imshow("Capture View", frame)
-
-            key = cv2.waitKey(1) & 0xFF
-
-            save_label = ""
-            if key == ord('l'):
-                save_label = "left"
-            elif key == ord('c'):
-                save_label = "center"
-            elif key == ord('r'):
-                save_label = "right"
-            elif key == ord('n'):
-                save_label = "none"
-            elif key == ord('q'):
-                break
 
-            if save_label:
-                timestamp = int(time.time() * 1000)
-                filename = f"{base_dir}/{save_label}/{save_label}_{timestamp}.jpg"
-                cv2.imwrite(filename, frame)
-                print(f"Saved: {filename}")
-                time.sleep(0.1)
+        if save_label:
+            timestamp = int(time.time() * 1000)
+            filename = f"{base_dir}/{save_label}/{save_label}_{timestamp}.jpg"
+            cv2.imwrite(filename, frame)
+            print(f"Saved: {filename}")
+            time.sleep(0.1)
 
 except Exception as e:
     print(f"Error: {e}")
@@ -1,164 +1,220 @@
 import cv2
+import os
+import queue
 import time
 import RPi.GPIO as GPIO
 
 from modules.actuators import DifferentialDrive, ServoMotor
-from modules.inputs import Button, UltrasonicSensor, PIRSensor
+from modules.inputs import Button, UltrasonicSensor, PIRSensor, SensorSampler, UltrasonicScheduler
 from modules.outputs import LED, Buzzer, LCD
 from modules.services import Bluetooth
 from modules.inferences import Vision
+from modules.runtime import ActionScheduler, Runtime
+
+# Without a display there is nobody to look at the overlay, so skip drawing
+# and the GUI event pump entirely.
+HEADLESS = not os.environ.get("DISPLAY")
+
+# Decisions run on a fixed tick, so the distance covered between an
+# obstacle reading and the stop command is bounded by speed / CONTROL_HZ.
+CONTROL_HZ = 20
 
 def main():
+    boot_start = time.monotonic()
     print("Initializing Autonomous Waste Bin...")
 
     try:
         drive_base = DifferentialDrive()
-        lid_servo = ServoMotor(pin=18, init_angle=90) 
+        lid_servo = ServoMotor(pin=18, init_angle=90)
 
-        sensor_load = UltrasonicSensor(trig_pin=23, echo_pin=24)
-        sensor_obstacle = UltrasonicSensor(trig_pin=5, echo_pin=6)
-        pir = PIRSensor(pin=25)
-        btn_power = Button(pin=26)
+        sensor_load = UltrasonicSensor(trig_pin=23, echo_pin=24, interrupt=True)
+        sensor_obstacle = UltrasonicSensor(trig_pin=5, echo_pin=6, interrupt=True)
+        # Button presses and PIR changes arrive as timestamped edge events.
+        input_events = queue.Queue()
+        pir = PIRSensor(pin=25, events=input_events)
+        btn_power = Button(pin=26, events=input_events)
 
         led_status = LED(pin=19)
         buzzer = Buzzer(pin=13)
         lcd = LCD(i2c_addr=0x27)
-        
+
         bt_server = Bluetooth()
-        ai_system = Vision()
-
-        system_active = False
-        bin_check_count = 0
-        
-        current_action = "stop"
-        action_end_time = 0
-
-        print("System Ready")
-        lcd.write_text("System Ready", 1)
-        lcd.write_text("Waiting BT...", 2)
-
-        while True:
-            if btn_power.is_pressed():
-                system_active = not system_active
-                led_status.set_state(system_active)
-                print(f"Manual State Change: {system_active}")
-
-            bt_cmd = bt_server.update()
-            if bt_cmd:
-                print(f"BT Command: {bt_cmd}")
-                if bt_cmd == '0':
-                    system_active = False
-                elif bt_cmd == '1':
-                    system_active = True
-                elif bt_cmd == '2':
-                    dist = sensor_load.get_distance()
-                    bt_server.send_byte(4 if 0 < dist < 3 else 3)
-                
-                led_status.set_state(system_active)
-
-            dist_load = sensor_load.get_distance()
-            dist_front = sensor_obstacle.get_distance()
-            motion_detected = pir.is_active()
-            
-            raw_direction, score, frame, scores = ai_system.process_frame()
-
-            if system_active:
-                if 0 < dist_load < 1.5:
-                    bin_check_count += 1
-                else:
-                    bin_check_count = 0
+        ai_system = Vision(batched=True, worker=True, change_threshold=6.0, headless=HEADLESS, track_interval=5)
+
+        def next_detection():
+            ai_system.wait_for_frame(0.5)
+            return ai_system.process_frame()
+
+        # Sensors are sampled and filtered on their own threads; the control
+        # loop only reads the latest filtered values. Timeouts (-1) never
+        # enter the filters.
+        sampler = SensorSampler()
+        sampler.add("load", None, None, window=5, valid=lambda d: d > 0)
+        sampler.add("front", None, None, window=3, valid=lambda d: d > 0)
+        sampler.start()
+
+        # The load sensor looks down into the bin and the obstacle sensor
+        # forward, so they cannot hear each other and ping together. The
+        # obstacle sensor wins any contention.
+        rangers = UltrasonicScheduler(on_reading=sampler.push)
+        rangers.add("front", sensor_obstacle, rate=20, priority=1, group="front")
+        rangers.add("load", sensor_load, rate=10, group="bin")
+        rangers.start()
+
+        # Each device runs at its own rate; anything that can block for more
+        # than a GPIO read goes to the executor.
+        rt = Runtime()
+        rt.listen(input_events)
+        rt.poll("bluetooth", bt_server.update, rate=20, blocking=True, when=bool)
+        rt.poll("vision", next_detection, blocking=True)
+
+        lcd_lines = {}
+
+        async def show(line1, line2):
+            # The LCD takes tens of milliseconds per line, so only changed
+            # lines are rewritten, in the background.
+            for line, text in ((1, line1), (2, line2)):
+                if lcd_lines.get(line) != text:
+                    lcd_lines[line] = text
+                    rt.post(lcd.write_text, text, line)
+
+        # Sequences run as steps next to the control loop, so sensors and
+        # Bluetooth stay live and a stop can interrupt them.
+        actions = ActionScheduler(rt)
+        close_lid = [(lid_servo.set_angle, 90, 0.02)]
+
+        bin_full_steps = [
+            (buzzer.play_note, 'C4', 0.1), 0.05,
+            (buzzer.play_note, 'E4', 0.1), 0.05,
+            (buzzer.play_note, 'G4', 0.1), 0.05,
+            (buzzer.play_note, 'C5', 0.2),
+            (show, "!! BIN FULL !!", "Please Empty"),
+            (bt_server.send_byte, 4),
+            (lid_servo.set_angle, 180, 0.02), 10,
+            (lid_servo.set_angle, 90, 0.02), 1
+        ]
+
+        lid_steps = [
+            (show, "Motion Detect", "Opening..."),
+            (lid_servo.set_angle, 180, 0.02), 5,
+            (show, "Motion Detect", "Closing..."),
+            (lid_servo.set_angle, 90, 0.02), 1
+        ]
+
+        async def control():
+            system_active = False
+
+            current_action = "stop"
+            action_end_time = 0
+
+            print(f"System Ready ({time.monotonic() - boot_start:.1f}s)")
+            await show("System Ready", "Waiting BT...")
+
+            ticker = rt.deadline("control", CONTROL_HZ)
+            while True:
+                current_time = await ticker.wait()
+                events = rt.drain()
+                new_frame = False
+
+                for name, value, stamp in events:
+                    if name == "button":
+                        system_active = not system_active
+                        led_status.set_state(system_active)
+                        print(f"Manual State Change: {system_active}")
+
+                    elif name == "bluetooth":
+                        print(f"BT Command: {value}")
+                        if value == '0':
+                            system_active = False
+                        elif value == '1':
+                            system_active = True
+                        elif value == '2':
+                            dist = sampler.median("load", max_age=1.0)
+                            bt_server.send_byte(4 if 0 < dist < 3 else 3)
+
+                        led_status.set_state(system_active)
+
+                    elif name == "vision":
+                        new_frame = True
+
+                # The bin-full check uses the median of the last five load
+                # readings instead of counting consecutive hits.
+                dist_load = sampler.median("load", max_age=1.0)
+                dist_front = sampler.median("front", max_age=0.5)
+                motion_detected = pir.is_active()
+                raw_direction, score, frame, scores = rt.latest("vision", ("None", 0.0, None, {}))
+                notices = []
+
+                if system_active:
+                    if 0 < dist_load < 1.5 and not actions.busy("bin_full"):
+                        drive_base.stop()
+                        action_end_time = 0
 
-                if bin_check_count >= 5:
-                    drive_base.stop()
-                    action_end_time = 0 
-                    
-                    buzzer.play_note('C4', 0.1); time.sleep(0.05)
-                    buzzer.play_note('E4', 0.1); time.sleep(0.05)
-                    buzzer.play_note('G4', 0.1); time.sleep(0.05)
-                    buzzer.play_note('C5', 0.2)
-                    
-                    print("Bin Full")
-                    lcd.write_text("!! BIN FULL !!", 1)
-                    lcd.write_text("Please Empty", 2)
-                    cv2.putText(frame, "BIN FULL!", (180, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 0, 0), 3)
-
-                    bt_server.send_byte(4)
-
-                    lid_servo.set_angle(180, speed=0.02)
-                    time.sleep(10)
-                    lid_servo.set_angle(90, speed=0.02)
-                    time.sleep(1)
-                    bin_check_count = 0
-
-                elif motion_detected and (0 < dist_front < 5):
-                    drive_base.stop()
-                    action_end_time = 0
-                    
-                    print(f"Opening Lid (Dist: {dist_front:.1f}cm)")
-                    
-                    lcd.write_text("Motion Detect", 1)
-                    lcd.write_text("Opening...", 2)
-                    
-                    lid_servo.set_angle(180, speed=0.02)
-                    time.sleep(5) 
-                    
-                    lcd.write_text("Closing...", 2)
-                    lid_servo.set_angle(90, speed=0.02)
-                    time.sleep(1)
+                        # Bin full takes over from a lid cycle in progress.
+                        print("Bin Full")
+                        actions.start("bin_full", bin_full_steps, close_lid)
 
-                else:
-                    if 0 < dist_front < 10:
+                    elif motion_detected and (0 < dist_front < 5) and not actions.busy():
                         drive_base.stop()
                         action_end_time = 0
-                        
-                        lcd.write_text("Running...", 1)
-                        lcd.write_text("OBSTACLE", 2)
-                        cv2.putText(frame, "OBSTACLE", (200, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-                        current_action = "stop"
+
+                        print(f"Opening Lid (Dist: {dist_front:.1f}cm)")
+                        actions.start("lid", lid_steps, close_lid)
+
+                    elif actions.busy():
+                        if actions.busy("bin_full"):
+                            notices.append(("BIN FULL!", (180, 120), 1.5, (255, 0, 0), 3))
 
                     else:
-                        current_time = time.time()
+                        if 0 < dist_front < 10:
+                            drive_base.stop()
+                            action_end_time = 0
+
+                            await show("Running...", "OBSTACLE")
+                            notices.append(("OBSTACLE", (200, 120), 1.5, (0, 0, 255), 3))
+                            current_action = "stop"
 
-                        if current_time < action_end_time:
-                            pass 
-                        
                         else:
-                            if raw_direction != "None":
-                                current_action = raw_direction
-                                action_end_time = current_time + 5.0 
+                            if current_time < action_end_time:
+                                pass
+
                             else:
-                                current_action = "stop"
-
-                        load_msg = f"L:{dist_load:.0f}cm" if dist_load > 0 else "L:Err"
-                        lcd.write_text(f"Run: {current_action}", 1)
-                        lcd.write_text(load_msg, 2)
-                        
-                        remain = max(0, action_end_time - current_time)
-                        if remain > 0:
-                            status_text = f"LOCKED: {current_action} ({remain:.1f}s)"
-                            color = (0, 0, 255)
-                        else:
-                            status_text = f"FREE: {current_action}"
-                            color = (0, 255, 0)
+                                if raw_direction != "None":
+                                    current_action = raw_direction
+                                    action_end_time = current_time + 5.0
+                                else:
+                                    current_action = "stop"
+
+                            load_msg = f"L:{dist_load:.0f}cm" if dist_load > 0 else "L:Err"
+                            await show(f"Run: {current_action}", load_msg)
+
+                            remain = max(0, action_end_time - current_time)
+                            if remain > 0:
+                                notices.append((f"LOCKED: {current_action} ({remain:.1f}s)", (10, 30), 0.7, (0, 0, 255), 2))
+                            else:
+                                notices.append((f"FREE: {current_action}", (10, 30), 0.7, (0, 255, 0), 2))
 
-                        cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+                            if current_action == "Center": drive_base.move("forward")
+                            elif current_action == "Left": drive_base.move("left")
+                            elif current_action == "Right": drive_base.move("right")
+                            else: drive_base.stop()
 
-                        if current_action == "Center": drive_base.move("forward")
-                        elif current_action == "Left": drive_base.move("left")
-                        elif current_action == "Right": drive_base.move("right")
-                        else: drive_base.stop()
+                else:
+                    # Stopping interrupts any sequence and closes the lid.
+                    actions.cancel()
+                    drive_base.stop()
+                    await show("Standby Mode", "BT Ready")
+                    current_action = "stop"
+                    action_end_time = 0
 
-            else:
-                drive_base.stop()
-                lcd.write_text("Standby Mode", 1)
-                lcd.write_text("BT Ready", 2)
-                bin_check_count = 0
-                current_action = "stop"
-                action_end_time = 0
+                if new_frame and not HEADLESS:
+                    for text, org, scale, color, thickness in notices:
+                        cv2.putText(frame, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+                    cv2.imshow("Split Detection View", frame)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
 
-            cv2.imshow("Split Detection View", frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        rt.run(control())
 
     except KeyboardInterrupt:
         print("Stopping...")
@@ -169,10 +225,12 @@ def main():
         if 'drive_base' in locals(): drive_base.cleanup()
         if 'lcd' in locals(): lcd.clear()
         if 'bt_server' in locals(): bt_server.cleanup()
+        if 'rangers' in locals(): rangers.stop()
+        if 'sampler' in locals(): sampler.stop()
         if 'ai_system' in locals(): ai_system.close()
         GPIO.cleanup()
-        cv2.destroyAllWindows()
+        if not HEADLESS: cv2.destroyAllWindows()
         print("Terminated")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
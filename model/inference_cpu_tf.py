@@ -1,9 +1,14 @@
 import cv2
+import os
+import sys
 import numpy as np
 import subprocess
 import time
 import tensorflow as tf
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.streams import MJPEGStream, decode_jpeg
+
 MODEL_PATH = "model_unquant.tflite"
 LABEL_PATH = "labels.txt"
 CONFIDENCE_THRESHOLD = 0.6
@@ -32,7 +37,7 @@ cmd = [
 ]
 process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=10**8)
 
-byte_buffer = b""
+stream = MJPEGStream(process.stdout)
 
 def run_inference(image_slice):
     img_resized = cv2.resize(image_slice, (model_w, model_h))
@@ -56,55 +61,47 @@ def run_inference(image_slice):
 
 try:
     while True:
-        chunk = process.stdout.read(4096)
-        if not chunk: break
-        byte_buffer += chunk
-
-        a = byte_buffer.find(b'\xff\xd8')
-        b = byte_buffer.find(b'\xff\xd9')
-
-        if a != -1 and b != -1:
-            jpg = byte_buffer[a:b+2]
-            byte_buffer = byte_buffer[b+2:]
-
-            frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-            if frame is None: continue
-
-            height, width, _ = frame.shape
-            
-            w_step = width // 3
-            img_left = frame[:, :w_step]
-            img_center = frame[:, w_step:w_step*2]
-            img_right = frame[:, w_step*2:]
-
-            score_l = run_inference(img_left)
-            score_c = run_inference(img_center)
-            score_r = run_inference(img_right)
-
-            scores = {'Left': score_l, 'Center': score_c, 'Right': score_r}
-            best_pos = max(scores, key=scores.get)
-            best_score = scores[best_pos]
-
-            final_decision = "None"
-            if best_score > CONFIDENCE_THRESHOLD:
-                final_decision = best_pos
-
-            cv2.line(frame, (w_step, 0), (w_step, height), (255, 255, 255), 2)
-            cv2.line(frame, (w_step*2, 0), (w_step*2, height), (255, 255, 255), 2)
-
-            text = f"Result: {final_decision} ({best_score*100:.1f}%)"
-            color = (0, 255, 0) if final_decision != "None" else (0, 0, 255)
-            
-            # Debug info (Show scores for all sections)
-            cv2.putText(frame, f"L:{score_l:.2f}", (10, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-            cv2.putText(frame, f"C:{score_c:.2f}", (230, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-            cv2.putText(frame, f"R:{score_r:.2f}", (450, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-            cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-            cv2.imshow("AI Test View", frame)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        jpg = stream.read(latest=True)
+        if jpg is None: break
+
+        frame = decode_jpeg(jpg)
+        if frame is None: continue
+
+        height, width, _ = frame.shape
+        
+        w_step = width // 3
+        img_left = frame[:, :w_step]
+        img_center = frame[:, w_step:w_step*2]
+        img_right = frame[:, w_step*2:]
+
+        score_l = run_inference(img_left)
+        score_c = run_inference(img_center)
+        score_r = run_inference(img_right)
+
+        scores = {'Left': score_l, 'Center': score_c, 'Right': score_r}
+        best_pos = max(scores, key=scores.get)
+        best_score = scores[best_pos]
+
+        final_decision = "None"
+        if best_score > CONFIDENCE_THRESHOLD:
+            final_decision = best_pos
+
+        cv2.line(frame, (w_step, 0), (w_step, height), (255, 255, 255), 2)
+        cv2.line(frame, (w_step*2, 0), (w_step*2, height), (255, 255, 255), 2)
+
+        text = f"Result: {final_decision} ({best_score*100:.1f}%)"
+        color = (0, 255, 0) if final_decision != "None" else (0, 0, 255)
+        
+        # Debug info (Show scores for all sections)
+        cv2.putText(frame, f"L:{score_l:.2f}", (10, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+        cv2.putText(frame, f"C:{score_c:.2f}", (230, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+        cv2.putText(frame, f"R:{score_r:.2f}", (450, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
+
+        cv2.putText(frame, text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+        cv2.imshow("AI Test View", frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
 
 except Exception as e:
     print(f"Error: {e}")
@@ -1,9 +1,14 @@
 import cv2
+import os
+import sys
 import numpy as np
 import subprocess
 import time
 import tensorflow as tf
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.streams import MJPEGStream, decode_jpeg
+
 Interpreter = tf.lite.Interpreter
 load_delegate = tf.lite.load_delegate
 
@@ -33,50 +38,42 @@ cmd = [
 ]
 process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=10**8)
 
-byte_buffer = b""
+stream = MJPEGStream(process.stdout)
 
 try:
     while True:
-        chunk = process.stdout.read(4096)
-        if not chunk: break
-        byte_buffer += chunk
-
-        a = byte_buffer.find(b'\xff\xd8')
-        b = byte_buffer.find(b'\xff\xd9')
-
-        if a != -1 and b != -1:
-            jpg = byte_buffer[a:b+2]
-            byte_buffer = byte_buffer[b+2:]
-
-            frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-            if frame is None: continue
-
-            img_resized = cv2.resize(frame, (width, height))
-            input_data = np.expand_dims(img_resized, axis=0)
-
-            interpreter.set_tensor(input_details[0]['index'], input_data)
-            interpreter.invoke()
-
-            output_data = interpreter.get_tensor(output_details[0]['index'])
-            prediction = np.squeeze(output_data)
-            
-            class_id = np.argmax(prediction)
-            score = prediction[class_id] / 255.0
-            
-            result_text = f"{labels[class_id]}: {score*100:.1f}%"
-            
-            color = (0, 255, 0)
-            if score < CONFIDENCE_THRESHOLD:
-                result_text = "Uncertain"
-                color = (0, 0, 255)
-
-            cv2.putText(frame, result_text, (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-            
-            cv2.imshow("AI Test View", frame)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+        jpg = stream.read(latest=True)
+        if jpg is None: break
+
+        frame = decode_jpeg(jpg)
+        if frame is None: continue
+
+        img_resized = cv2.resize(frame, (width, height))
+        input_data = np.expand_dims(img_resized, axis=0)
+
+        interpreter.set_tensor(input_details[0]['index'], input_data)
+        interpreter.invoke()
+
+        output_data = interpreter.get_tensor(output_details[0]['index'])
+        prediction = np.squeeze(output_data)
+        
+        class_id = np.argmax(prediction)
+        score = prediction[class_id] / 255.0
+        
+        result_text = f"{labels[class_id]}: {score*100:.1f}%"
+        
+        color = (0, 255, 0)
+        if score < CONFIDENCE_THRESHOLD:
+            result_text = "Uncertain"
+            color = (0, 0, 255)
+
+        cv2.putText(frame, result_text, (10, 30), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        
+        cv2.imshow("AI Test View", frame)
+
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
 
 except Exception as e:
     print(f"Error: {e}")
@@ -17,47 +17,58 @@ class DifferentialDrive:
             [0,0,1,0], [0,0,1,1], [0,0,0,1], [1,0,0,1]
         ]
 
+        self.pins = self.L_PINS + self.R_PINS
+        self.off = [0] * len(self.pins)
+
+        # One row per step with all eight pin levels, so a step is a single
+        # GPIO.output call instead of an index lookup and eight writes.
+        self.tables = {
+            "forward": self._build_table(1 * self.L_DIR, 1 * self.R_DIR),
+            "left": self._build_table(-1 * self.L_DIR, 1 * self.R_DIR),
+            "right": self._build_table(1 * self.L_DIR, -1 * self.R_DIR)
+        }
+
         GPIO.setmode(GPIO.BCM)
-        for pin in self.L_PINS + self.R_PINS:
+        for pin in self.pins:
             GPIO.setup(pin, GPIO.OUT)
-            GPIO.output(pin, 0)
+        GPIO.output(self.pins, self.off)
 
         self.current_action = "stop"
         self.running = True
         self.thread = threading.Thread(target=self._motor_loop, daemon=True)
         self.thread.start()
 
-    def _step_one(self, pins, direction_val, step_index):
-        seq_idx = step_index % 8
-        if direction_val == -1:
-            seq_idx = 7 - seq_idx
-            
-        val = self.seq[seq_idx]
-        for i in range(4):
-            GPIO.output(pins[i], val[i])
+    def _build_table(self, l_dir, r_dir):
+        table = []
+        for step_index in range(8):
+            l_idx = step_index if l_dir == 1 else 7 - step_index
+            r_idx = step_index if r_dir == 1 else 7 - step_index
+            table.append(tuple(self.seq[l_idx] + self.seq[r_idx]))
+        return table
 
     def _motor_loop(self):
         step_counter = 0
+        next_step = time.monotonic()
         
         while self.running:
-            if self.current_action == "stop":
+            table = self.tables.get(self.current_action)
+            if table is None:
                 time.sleep(0.1)
+                next_step = time.monotonic()
                 continue
 
-            if self.current_action == "forward":
-                self._step_one(self.L_PINS, 1 * self.L_DIR, step_counter)
-                self._step_one(self.R_PINS, 1 * self.R_DIR, step_counter)
-                
-            elif self.current_action == "left":
-                self._step_one(self.L_PINS, -1 * self.L_DIR, step_counter)
-                self._step_one(self.R_PINS, 1 * self.R_DIR, step_counter)
-                
-            elif self.current_action == "right":
-                self._step_one(self.L_PINS, 1 * self.L_DIR, step_counter)
-                self._step_one(self.R_PINS, -1 * self.R_DIR, step_counter)
-
+            GPIO.output(self.pins, table[step_counter % 8])
             step_counter += 1
-            time.sleep(self.step_delay)
+
+            # Absolute deadlines keep the step rate from drifting with the
+            # time spent writing pins; after a stall the schedule restarts
+            # instead of bursting steps to catch up.
+            next_step += self.step_delay
+            delay = next_step - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -self.step_delay:
+                next_step = time.monotonic()
 
     def move(self, direction="stop"):
         self.current_action = direction
@@ -65,8 +76,7 @@ class DifferentialDrive:
     def stop(self):
         self.current_action = "stop"
         time.sleep(self.step_delay * 2) 
-        for pin in self.L_PINS + self.R_PINS:
-            GPIO.output(pin, 0)
+        GPIO.output(self.pins, self.off)
 
     def cleanup(self):
         self.running = False
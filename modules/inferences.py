@@ -1,116 +1,1120 @@
 import cv2
+import hashlib
+import json
+import multiprocessing
 import numpy as np
+import os
+import platform
+import queue
 import subprocess
-import tensorflow as tf
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
 
-class Vision:
-    def __init__(self, model_path="model/model_unquant.tflite", label_path="model/labels.txt"):
-        self.interpreter = tf.lite.Interpreter(model_path=model_path)
+from modules.streams import DECODE_FLAGS, MJPEGStream, YUV420Stream, decode_jpeg, select_decode_scale
+
+def split_regions(frame, count=3):
+    w_step = frame.shape[1] // count
+    bounds = [i * w_step for i in range(count)] + [frame.shape[1]]
+    return [frame[:, bounds[i]:bounds[i+1]] for i in range(count)]
+
+PROFILE_PATH = "model/autotune.json"
+
+_tflite = None
+
+def load_tflite():
+    # tflite_runtime and ai_edge_litert import in a fraction of the time
+    # tensorflow takes on a Pi, so only fall back to it when neither exists.
+    global _tflite
+    if _tflite is None:
+        start = time.monotonic()
+        try:
+            from tflite_runtime.interpreter import Interpreter, load_delegate
+            name = "tflite_runtime"
+        except ImportError:
+            try:
+                from ai_edge_litert.interpreter import Interpreter, load_delegate
+                name = "ai_edge_litert"
+            except ImportError:
+                import tensorflow as tf
+                Interpreter, load_delegate = tf.lite.Interpreter, tf.lite.load_delegate
+                name = "tensorflow"
+        _tflite = (Interpreter, load_delegate, name, time.monotonic() - start)
+    return _tflite
+
+# No quantized model ships with the repo, so cpu-int8 is only tried once a
+# path for it is passed in model_paths.
+MODEL_PATHS = {
+    "edgetpu": "model/model_edgetpu.tflite",
+    "cpu-float": "model/model_unquant.tflite"
+}
+
+PROBE_ORDER = ("edgetpu", "cpu-int8", "cpu-float")
+
+class CPUFloatBackend:
+    name = "cpu-float"
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+
+    def create_interpreter(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(self.model_path)
+        Interpreter = load_tflite()[0]
+        return Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+
+class CPUInt8Backend(CPUFloatBackend):
+    # Same interpreter as cpu-float; what makes this the int8 path is the
+    # quantized model file, whose int8 ops the interpreter hands to its
+    # built-in XNNPACK kernels.
+    name = "cpu-int8"
+
+class EdgeTPUBackend(CPUFloatBackend):
+    name = "edgetpu"
+    delegate_lib = "libedgetpu.so.1.0"
+
+    def create_interpreter(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(self.model_path)
+        Interpreter, load_delegate = load_tflite()[:2]
+        return Interpreter(
+            model_path=self.model_path,
+            experimental_delegates=[load_delegate(self.delegate_lib)]
+        )
+
+class FakeInterpreter:
+    def __init__(self, input_shape=(1, 224, 224, 3), num_classes=2, target_idx=1):
+        self.input_shape = list(input_shape)
+        self.num_classes = num_classes
+        self.target_idx = target_idx
+        self.invokes = 0
+
+    def allocate_tensors(self):
+        self.input = np.zeros(self.input_shape, np.float32)
+        self.output = np.zeros((self.input_shape[0], self.num_classes), np.float32)
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array(self.input.shape), 'dtype': np.float32}]
+
+    def get_output_details(self):
+        return [{'index': 1, 'shape': np.array(self.output.shape), 'dtype': np.float32}]
+
+    def resize_tensor_input(self, index, shape):
+        self.input_shape = list(shape)
+
+    def tensor(self, index):
+        return lambda: self.input if index == 0 else self.output
+
+    def set_tensor(self, index, value):
+        self.input[...] = value
+
+    def get_tensor(self, index):
+        return self.output.copy()
+
+    def invoke(self):
+        # Brightness stands in for the target class so tests can steer scores.
+        brightness = (self.input.reshape(len(self.input), -1).mean(axis=1) + 1.0) / 2.0
+        self.output[:] = ((1.0 - brightness) / (self.num_classes - 1))[:, None]
+        self.output[:, self.target_idx] = brightness
+        self.invokes += 1
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, model_path=None, num_threads=None, input_shape=(1, 224, 224, 3)):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self.input_shape = input_shape
+
+    def create_interpreter(self):
+        return FakeInterpreter(self.input_shape)
+
+BACKENDS = {
+    "edgetpu": EdgeTPUBackend,
+    "cpu-int8": CPUInt8Backend,
+    "cpu-float": CPUFloatBackend,
+    "fake": FakeBackend
+}
+
+def select_backend(preference="auto", model_paths=None, num_threads=None):
+    paths = dict(MODEL_PATHS, **(model_paths or {}))
+    names = [name for name in PROBE_ORDER if name in paths] if preference == "auto" else [preference]
+
+    for name in names:
+        backend = BACKENDS[name](paths.get(name), num_threads)
+        try:
+            backend.create_interpreter()
+        except Exception as e:
+            print(f"Backend {name} unavailable ({e})")
+            continue
+        return backend
+
+    raise RuntimeError(f"No inference backend available from {names}")
+
+class ChangeDetector:
+    def __init__(self, region_count=3, threshold=6.0, max_age=2.0, size=(16, 12)):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.size = size
+        self.signatures = [np.zeros((size[1], size[0]), np.uint8) for _ in range(region_count)]
+        self.candidates = [np.zeros((size[1], size[0]), np.uint8) for _ in range(region_count)]
+        self.stamps = [None] * region_count
+
+    def select(self, imgs, now=None):
+        now = time.monotonic() if now is None else now
+        changed = []
+        for i, img in enumerate(imgs):
+            small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self.candidates[i])
+
+            if self.stamps[i] is None or now - self.stamps[i] > self.max_age:
+                changed.append(i)
+            elif cv2.norm(self.candidates[i], self.signatures[i], cv2.NORM_L1) / self.candidates[i].size > self.threshold:
+                changed.append(i)
+        return changed
+
+    def update(self, indices, now=None):
+        now = time.monotonic() if now is None else now
+        for i in indices:
+            self.signatures[i], self.candidates[i] = self.candidates[i], self.signatures[i]
+            self.stamps[i] = now
+
+class RegionScorer:
+    def __init__(self, backend, region_count=3, batched=False, target_idx=1, change_threshold=None, max_staleness=2.0,
+                 threads=1):
+        self.backend = backend
+        self.interpreter = backend.create_interpreter()
         self.interpreter.allocate_tensors()
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
-        
+
         self.h = self.input_details[0]['shape'][1]
         self.w = self.input_details[0]['shape'][2]
         self.is_float = (self.input_details[0]['dtype'] == np.float32)
-        
+        self.target_idx = target_idx
+
+        self.region_count = region_count
+        self.batched = batched and self._resize_batch(region_count)
+        self._prepare_buffers()
+
+        # invoke() releases the GIL, so unbatched regions can run at once as
+        # long as each thread has an interpreter of its own.
+        self.pool = None
+        self.helpers = []
+        if threads > 1 and not self.batched:
+            self.helpers = [RegionScorer(backend, 1, target_idx=target_idx) for _ in range(threads - 1)]
+            self.idle = queue.Queue()
+            for scorer in [self] + self.helpers:
+                self.idle.put(scorer)
+            self.pool = ThreadPoolExecutor(threads)
+
+        self.detector = None
+        if change_threshold is not None:
+            self.detector = ChangeDetector(region_count, change_threshold, max_staleness)
+        self.last_scores = None
+
+        self.frames = 0
+        self.invokes = 0
+        self.regions_inferred = 0
+        self.regions_skipped = 0
+
+    def _resize_batch(self, batch_size):
+        index = self.input_details[0]['index']
+        shape = list(self.input_details[0]['shape'])
+        try:
+            self.interpreter.resize_tensor_input(index, [batch_size] + shape[1:])
+            self.interpreter.allocate_tensors()
+            output_shape = self.interpreter.get_output_details()[0]['shape']
+            if output_shape[0] != batch_size:
+                raise ValueError("Model output is not batched")
+        except Exception as e:
+            print(f"Batched inference unavailable ({e}), using per-region inference")
+            self.interpreter.resize_tensor_input(index, shape)
+            self.interpreter.allocate_tensors()
+            return False
+
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        return True
+
+    def _prepare_buffers(self):
+        # tensor() views must not outlive a call, so keep the accessors and
+        # a persistent staging array instead of the arrays themselves.
+        self.input_tensor = self.interpreter.tensor(self.input_details[0]['index'])
+        self.output_tensor = self.interpreter.tensor(self.output_details[0]['index'])
+
+        batch_size = self.input_details[0]['shape'][0]
+        self.staging = np.zeros([batch_size, self.h, self.w, 3], np.uint8)
+        self.norm_lut = (np.arange(256, dtype=np.float32) / 127.5) - 1.0
+
+    def _load_input(self, slot, img):
+        if self.is_float:
+            cv2.resize(img, (self.w, self.h), dst=self.staging[slot])
+        else:
+            tensor = self.input_tensor()
+            cv2.resize(img, (self.w, self.h), dst=tensor[slot])
+            del tensor
+
+    def _invoke(self, imgs):
+        for i, img in enumerate(imgs):
+            self._load_input(i, img)
+
+        if self.is_float:
+            tensor = self.input_tensor()
+            np.take(self.norm_lut, self.staging, out=tensor, mode='clip')
+            del tensor
+
+        self.interpreter.invoke()
+        self.invokes += 1
+
+    def _inference(self, imgs):
+        self._invoke(imgs)
+        preds = self.output_tensor()[:, self.target_idx]
+        scores = [float(p) if self.is_float else p / 255.0 for p in preds]
+        del preds
+
+        return scores
+
+    def _pooled_inference(self, img):
+        scorer = self.idle.get()
+        try:
+            return scorer._inference([img])[0]
+        finally:
+            self.idle.put(scorer)
+
+    def score(self, imgs):
+        changed = list(range(len(imgs)))
+        if self.detector:
+            selected = self.detector.select(imgs)
+            if self.last_scores is not None and not (self.batched and selected):
+                changed = selected
+            self.detector.update(changed)
+
+        if self.batched and changed:
+            scores = self._inference(imgs)
+        else:
+            scores = list(self.last_scores or [0.0] * len(imgs))
+            if self.pool and len(changed) > 1:
+                results = self.pool.map(self._pooled_inference, [imgs[i] for i in changed])
+                for i, score in zip(changed, results):
+                    scores[i] = score
+            else:
+                for i in changed:
+                    scores[i] = self._inference([imgs[i]])[0]
+
+        self.regions_inferred += len(changed)
+        self.regions_skipped += len(imgs) - len(changed)
+        self.last_scores = scores
+        return scores
+
+    def score_frame(self, frame):
+        self.frames += 1
+        return self.score(split_regions(frame, self.region_count)), None
+
+    def stats(self):
+        invokes = self.invokes + sum(scorer.invokes for scorer in self.helpers)
+        return {
+            "frames": self.frames,
+            "invokes": invokes,
+            "invokes_per_frame": invokes / max(self.frames, 1),
+            "regions_inferred": self.regions_inferred,
+            "regions_skipped": self.regions_skipped
+        }
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+        for scorer in self.helpers:
+            scorer.close()
+        self.interpreter = None
+
+class Localizer(RegionScorer):
+    MODEL_TYPES = ("detection", "heatmap")
+
+    def __init__(self, backend, region_count=3, target_idx=1, model_type="detection", min_score=0.3):
+        if model_type not in self.MODEL_TYPES:
+            raise ValueError(f"Unknown model_type {model_type!r}")
+        super().__init__(backend, 1, False, target_idx)
+        self.region_count = region_count
+        self.model_type = model_type
+        self.min_score = min_score
+
+    def _output(self, detail):
+        data = self.interpreter.get_tensor(detail['index'])[0]
+        scale, zero_point = detail.get('quantization', (0.0, 0))
+        if scale:
+            data = (data.astype(np.float32) - zero_point) * scale
+        return data
+
+    def _detection_outputs(self):
+        # Output order differs between exporters; prefer names, then fall
+        # back to the classic SSD order (boxes, classes, scores, count).
+        # Single-class exports may have no class output at all.
+        named = {}
+        for detail in self.output_details:
+            name = detail.get('name', '').lower()
+            for key in ("box", "class", "score"):
+                if key in name:
+                    named[key] = detail
+        if "box" not in named or "score" not in named:
+            keys = ("box", "class", "score") if len(self.output_details) >= 3 else ("box", "score")
+            named = dict(zip(keys, self.output_details))
+
+        classes = self._output(named["class"]) if "class" in named else None
+        return self._output(named["box"]), classes, self._output(named["score"])
+
+    def _locate_detection(self):
+        boxes, classes, scores = self._detection_outputs()
+        if classes is not None:
+            scores = np.where(np.rint(classes).astype(int) == self.target_idx, scores, 0.0)
+        if not scores.size:
+            return None, 0.0
+
+        best = int(np.argmax(scores))
+        ymin, xmin, ymax, xmax = boxes[best]
+        return float(np.clip((xmin + xmax) / 2.0, 0.0, 1.0)), float(scores[best])
+
+    def _locate_heatmap(self):
+        heat = self._output(self.output_details[0])
+        if heat.ndim == 3:
+            heat = heat[..., self.target_idx if heat.shape[-1] > 1 else 0]
+
+        confidence = float(heat.max())
+        if confidence <= 0:
+            return None, confidence
+
+        weights = np.where(heat >= confidence * 0.5, heat, 0.0).sum(axis=0)
+        cols = (np.arange(heat.shape[1]) + 0.5) / heat.shape[1]
+        return float(weights @ cols / weights.sum()), confidence
+
+    def score_frame(self, frame):
+        self.frames += 1
+        self._invoke([frame])
+        if self.model_type == "heatmap":
+            x, confidence = self._locate_heatmap()
+        else:
+            x, confidence = self._locate_detection()
+
+        scores = [0.0] * self.region_count
+        if x is None or confidence < self.min_score:
+            return scores, None
+
+        scores[min(int(x * self.region_count), self.region_count - 1)] = confidence
+        return scores, 2.0 * x - 1.0
+
+class CascadeScorer:
+    def __init__(self, scorer, gate, gate_threshold=0.5, hold_threshold=0.4, hold_frames=5):
+        self.scorer = scorer
+        self.gate = gate
+        self.gate_threshold = gate_threshold
+        self.hold_threshold = hold_threshold
+        self.hold_frames = hold_frames
+
+        self.batched, self.h, self.w = scorer.batched, scorer.h, scorer.w
+        self.holding = 0
+
+        self.frames = 0
+        self.gate_runs = 0
+        self.gate_hits = 0
+
+    def score_frame(self, frame):
+        self.frames += 1
+
+        # While the region model keeps seeing the target the gate is skipped,
+        # so tracking does not flicker on a marginal gate score.
+        if self.holding == 0:
+            self.gate_runs += 1
+            if self.gate.score([frame])[0] < self.gate_threshold:
+                return [0.0] * self.scorer.region_count, None
+            self.gate_hits += 1
+
+        scores, steering = self.scorer.score_frame(frame)
+        if max(scores) >= self.hold_threshold:
+            self.holding = self.hold_frames
+        else:
+            self.holding = max(self.holding - 1, 0)
+        return scores, steering
+
+    def stats(self):
+        stats = self.scorer.stats()
+        invokes = stats["invokes"] + self.gate.invokes
+        stats.update({
+            "frames": self.frames,
+            "invokes": invokes,
+            "invokes_per_frame": invokes / max(self.frames, 1),
+            "gate_runs": self.gate_runs,
+            "gate_hits": self.gate_hits,
+            "gate_hit_rate": self.gate_hits / max(self.gate_runs, 1)
+        })
+        return stats
+
+    def close(self):
+        self.gate.close()
+        self.scorer.close()
+
+class TargetTracker:
+    def __init__(self, scorer, region_count=3, interval=5, min_confidence=0.6, threshold=0.4, width=160):
+        self.scorer = scorer
+        self.region_count = region_count
+        self.interval = interval
+        self.min_confidence = min_confidence
+        self.threshold = threshold
+        self.width = width
+
+        self.batched, self.h, self.w = scorer.batched, scorer.h, scorer.w
+        self.template = None
+        self.score = 0.0
+        self.since_full = 0
+
+        self.frames = 0
+        self.tracked = 0
+        self.lost = 0
+
+    def _gray(self, frame):
+        height = max(int(frame.shape[0] * self.width / frame.shape[1]), 1)
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _result(self, center):
+        scores = [0.0] * self.region_count
+        scores[min(int(center * self.region_count), self.region_count - 1)] = self.score
+        return scores, 2.0 * center - 1.0
+
+    def _track(self, gray):
+        # Full-height strips only slide sideways, which is all steering needs.
+        match = cv2.matchTemplate(gray, self.template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (x, _) = cv2.minMaxLoc(match)
+        if confidence < self.min_confidence:
+            self.lost += 1
+            return None
+
+        tw = self.template.shape[1]
+        self.template = gray[:, x:x + tw].copy()
+        return (x + tw / 2.0) / gray.shape[1]
+
+    def _start(self, gray, scores, steering):
+        self.template = None
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        center = (steering + 1.0) / 2.0 if steering is not None else (best + 0.5) / self.region_count
+        tw = max(gray.shape[1] // self.region_count // 2, 4)
+        x = int(np.clip(center * gray.shape[1] - tw / 2.0, 0, gray.shape[1] - tw))
+        template = gray[:, x:x + tw].copy()
+        if template.std() < 4.0:
+            return None
+
+        self.template = template
+        self.score = scores[best]
+        return (x + tw / 2.0) / gray.shape[1]
+
+    def score_frame(self, frame):
+        self.frames += 1
+        gray = self._gray(frame)
+
+        if self.template is not None and self.since_full < self.interval:
+            center = self._track(gray)
+            if center is not None:
+                self.since_full += 1
+                self.tracked += 1
+                return self._result(center)
+
+        scores, steering = self.scorer.score_frame(frame)
+        self.since_full = 0
+        center = self._start(gray, scores, steering)
+        if center is None:
+            return scores, steering
+        return scores, 2.0 * center - 1.0
+
+    def stats(self):
+        stats = self.scorer.stats()
+        stats.update({
+            "frames": self.frames,
+            "invokes_per_frame": stats["invokes"] / max(self.frames, 1),
+            "tracked_frames": self.tracked,
+            "track_losses": self.lost
+        })
+        return stats
+
+    def close(self):
+        self.scorer.close()
+
+def create_scorer(backend, model_type="regions", cascade=False, gate_model_path=None, gate_threshold=0.5,
+                  threshold=0.4, hold_frames=5, track_interval=None, track_confidence=0.6, **options):
+    # Only a region classifier can gate on its own backend; a localizer's
+    # outputs are boxes or heatmaps, not class scores.
+    if cascade and model_type != "regions" and not gate_model_path:
+        raise ValueError(f"cascade with model_type {model_type!r} needs a gate_model_path")
+
+    if model_type == "regions":
+        scorer = RegionScorer(backend, **options)
+    else:
+        # A localizer runs one whole-frame invoke, so region batching,
+        # per-region change detection and region threads do not apply.
+        for key in ("batched", "change_threshold", "max_staleness", "threads"):
+            options.pop(key, None)
+        scorer = Localizer(backend, model_type=model_type, **options)
+
+    if cascade:
+        # Without a dedicated gate model, the region model itself looks at the
+        # whole frame once, downsampled to a single input.
+        gate_backend = backend
+        if gate_model_path:
+            gate_backend = type(backend)(gate_model_path, backend.num_threads)
+        gate = RegionScorer(gate_backend, 1, target_idx=options.get("target_idx", 1))
+        scorer = CascadeScorer(scorer, gate, gate_threshold, threshold, hold_frames)
+
+    if track_interval:
+        scorer = TargetTracker(scorer, options.get("region_count", 3), track_interval, track_confidence, threshold)
+    return scorer
+
+def _host_key(model_paths):
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith(("Model", "model name")):
+                    cpu = line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+
+    digest = hashlib.sha256(cpu.encode())
+    for name in sorted(model_paths):
+        path = model_paths[name]
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def _benchmark(backend, batched, region_count, runs):
+    scorer = RegionScorer(backend, region_count, batched)
+    imgs = [np.random.randint(0, 256, (240, 213, 3), np.uint8) for _ in range(region_count)]
+    scorer.score(imgs)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        scorer.score(imgs)
+    elapsed = (time.perf_counter() - start) / runs
+
+    scorer.close()
+    return elapsed, scorer.batched
+
+def autotune(model_paths=None, region_count=3, runs=10):
+    paths = dict(MODEL_PATHS, **(model_paths or {}))
+    thread_options = [n for n in (1, 2, 4) if n <= (os.cpu_count() or 1)]
+
+    best = None
+    for name in [name for name in PROBE_ORDER if name in paths]:
+        for num_threads in ([None] if name == "edgetpu" else thread_options):
+            backend = BACKENDS[name](paths.get(name), num_threads)
+            for batched in (False, True):
+                try:
+                    elapsed, batched = _benchmark(backend, batched, region_count, runs)
+                except Exception:
+                    break
+
+                print(f"Autotune {name} threads={num_threads} batched={batched}: {elapsed*1000:.1f}ms/frame")
+                if best is None or elapsed < best["frame_ms"] / 1000:
+                    best = {"backend": name, "num_threads": num_threads, "batched": batched,
+                            "frame_ms": round(elapsed * 1000, 2)}
+
+    if best is None:
+        raise RuntimeError("No inference backend available for autotuning")
+    return best
+
+def load_profile(model_paths=None, region_count=3, profile_path=PROFILE_PATH):
+    paths = dict(MODEL_PATHS, **(model_paths or {}))
+    key = _host_key(paths)
+
+    profiles = {}
+    try:
+        with open(profile_path, 'r') as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if key not in profiles:
+        print("No tuned profile for this host, running autotune...")
+        profiles[key] = autotune(paths, region_count)
+        try:
+            with open(profile_path, 'w') as f:
+                json.dump(profiles, f, indent=2)
+        except OSError as e:
+            print(f"Could not save autotune profile ({e})")
+
+    config = profiles[key]
+    backend = BACKENDS[config["backend"]](paths.get(config["backend"]), config["num_threads"])
+    return backend, config["batched"]
+
+def _worker_main(backend, model_paths, scorer_options, requests, results):
+    # Backend probing happens here, so only the worker pays for importing
+    # the runtime and loading the model.
+    try:
+        if not hasattr(backend, "create_interpreter"):
+            backend = select_backend(backend, model_paths)
+        scorer = create_scorer(backend, **scorer_options)
+    except Exception as e:
+        results.put(("error", str(e)))
+        return
+    runtime = _tflite[2:] if _tflite else None
+    results.put(("ready", (backend, runtime, scorer.batched, scorer.h, scorer.w)))
+
+    # The frame ring is sized from the model input, so it is attached only
+    # after the parent has seen the ready message.
+    request = requests.get()
+    if request is None: return
+    shm_name, slot_shape, slots = request
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((slots,) + slot_shape, np.uint8, buffer=shm.buf)
+
+    try:
+        while True:
+            request = requests.get()
+            if request is None: break
+
+            slot, seq, h, w = request
+            scores, steering = scorer.score_frame(frames[slot, :h, :w])
+            results.put((seq, scores, steering, scorer.stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del frames
+        shm.close()
+
+class InferenceWorker:
+    def __init__(self, backend, scorer_options, model_paths=None, slots=2, timeout=60.0):
+        ctx = multiprocessing.get_context("spawn")
+        self.slots = slots
+        self.next_slot = 0
+        self.slots_free = threading.Semaphore(slots)
+        self.shm = None
+
+        self.requests = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(backend, model_paths, scorer_options, self.requests, self.results),
+            daemon=True
+        )
+        self.process.start()
+
+        try:
+            status, info = self.results.get(timeout=timeout)
+        except queue.Empty:
+            status, info = "error", "worker did not start"
+        if status != "ready":
+            self.close()
+            raise RuntimeError(info)
+        self.backend, self.runtime, self.batched, self.h, self.w = info
+
+    def allocate(self, slot_shape):
+        slot_shape = tuple(int(n) for n in slot_shape)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(slot_shape)) * self.slots)
+        self.frames = np.ndarray((self.slots,) + slot_shape, np.uint8, buffer=self.shm.buf)
+        self.requests.put((self.shm.name, slot_shape, self.slots))
+
+    def submit(self, frame, seq):
+        # Slots are reused round-robin; the semaphore keeps a slot from being
+        # overwritten while the worker may still be reading it.
+        if not self.slots_free.acquire(blocking=False):
+            return False
+
+        h, w, _ = frame.shape
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.slots
+        self.frames[slot, :h, :w] = frame
+        self.requests.put((slot, seq, h, w))
+        return True
+
+    def collect(self, timeout=None):
+        seq, scores, steering, stats = self.results.get(timeout=timeout)
+        self.slots_free.release()
+        return seq, scores, steering, stats
+
+    def close(self):
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+        if self.shm:
+            del self.frames
+            self.shm.close()
+            self.shm.unlink()
+
+class Vision:
+    def __init__(self, model_path="model/model_unquant.tflite", label_path="model/labels.txt", batched=False,
+                 reduced_decode=False, preview=True, worker=False, backend="auto", model_paths=None,
+                 autotune=False, change_threshold=None, max_staleness=2.0, headless=False,
+                 codec="mjpeg", source=None, resolution=(640, 240), roi=None, startup_timeout=5.0,
+                 model_type="regions", cascade=False, gate_model_path=None, gate_threshold=0.5, hold_frames=5,
+                 threads=1, track_interval=None, track_confidence=0.6):
+        start = time.monotonic()
+        self.startup_times = {}
+
         self.labels = [line.strip() for line in open(label_path, 'r').readlines()]
         self.target_idx = 1
         self.threshold = 0.4
 
-        cmd = [
-            "rpicam-vid", "-t", "0", "--inline", 
-            "--width", "640", "--height", "240", "--framerate", "20",
-            "--codec", "mjpeg", "--nopreview", "-o", "-"
-        ]
-        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+        self.region_names = ["Left", "Center", "Right"]
+        self.cam_w, self.cam_h = resolution
+        self.roi = tuple(roi) if roi else (0, 0, self.cam_w, self.cam_h)
+        self.codec = codec
+        self.headless = headless
+        self.preview = preview and not headless
+
+        # The camera warms up while the model loads. A recorded .mjpeg/.yuv
+        # file can stand in for it.
+        self.process = None
+        if source:
+            self.stream = open(source, 'rb')
+        else:
+            cmd = [
+                "rpicam-vid", "-t", "0", "--inline", 
+                "--width", str(self.cam_w), "--height", str(self.cam_h), "--framerate", "20",
+                "--codec", codec, "--nopreview", "-o", "-"
+            ]
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0)
+            self.stream = self.process.stdout
+
+        paths = dict({"cpu-float": model_path}, **(model_paths or {}))
+        if autotune:
+            backend, batched = load_profile(paths, len(self.region_names))
+
+        # An accelerator can only be opened by one process, so the scorer
+        # lives either in the worker or here, never both.
+        scorer_options = {
+            "model_type": model_type,
+            "cascade": cascade,
+            "gate_model_path": gate_model_path,
+            "gate_threshold": gate_threshold,
+            "threshold": self.threshold,
+            "hold_frames": hold_frames,
+            "track_interval": track_interval,
+            "track_confidence": track_confidence,
+            "region_count": len(self.region_names),
+            "batched": batched,
+            "target_idx": self.target_idx,
+            "change_threshold": change_threshold,
+            "max_staleness": max_staleness,
+            "threads": threads
+        }
+
+        self.scorer_options = scorer_options
+        self.scorer = None
+        self.worker = None
+        self.worker_stats = {}
+        self.worker_lost = False
+        self.runtime = None
+        if worker:
+            try:
+                self.worker = InferenceWorker(backend, scorer_options, paths)
+                self.backend, self.runtime = self.worker.backend, self.worker.runtime
+                self.h, self.w, self.batched = self.worker.h, self.worker.w, self.worker.batched
+            except Exception as e:
+                print(f"Inference worker unavailable ({e}), using in-process inference")
+
+        if self.worker is None:
+            self.backend = backend if hasattr(backend, "create_interpreter") else select_backend(backend, paths)
+            self.startup_times["backend"] = time.monotonic() - start
+            self.scorer = create_scorer(self.backend, **scorer_options)
+            self.h, self.w, self.batched = self.scorer.h, self.scorer.w, self.scorer.batched
+            self.runtime = _tflite[2:] if _tflite else None
+        print(f"Inference Backend: {self.backend.name}")
+        self.startup_times["model"] = time.monotonic() - start
+        self.startup_times.setdefault("backend", self.startup_times["model"])
+
+        self.decode_scale = 1
+        if reduced_decode:
+            x0, y0, x1, y1 = self.roi
+            self.decode_scale = select_decode_scale(x1 - x0, y1 - y0, self.w, self.h, len(self.region_names))
+        self.decode_flags = DECODE_FLAGS[self.decode_scale]
 
+        if self.worker:
+            self.worker.allocate(self._frame_shape())
+
+        self.frame_cond = threading.Condition()
         self.latest_frame = None
+        self.latest_raw = None
+        self.frame_seq = 0
+        self.frame_time = 0.0
+
+        self.last_seq = 0
+        self.last_frame_time = 0.0
+        self.last_result = None
+        self.steering = None
+        self.last_source = None
+        self.overlay = None
+        self.overlay_seq = 0
+
+        self.pending = {}
+        self.worker_result = None
+
         self.running = True
         self.thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.thread.start()
+
+        if self.worker:
+            self.result_thread = threading.Thread(target=self._result_loop, daemon=True)
+            self.result_thread.start()
         
         print("Camera System Initializing...")
-        time.sleep(1)
+        with self.frame_cond:
+            if not self.frame_cond.wait_for(lambda: self.frame_seq > 0, startup_timeout):
+                print(f"No camera frame after {startup_timeout:.1f}s")
+        self.startup_times["first_frame"] = time.monotonic() - start
+
+        self.startup_times["runtime_import"] = self.runtime[1] if self.runtime else 0.0
+        self.startup_times["total"] = time.monotonic() - start
+        print(self.startup_report())
+
+    def startup_report(self):
+        t = self.startup_times
+        runtime = self.runtime[0] if self.runtime else "none"
+        return (f"Vision ready in {t['total']:.2f}s (runtime {runtime} import {t['runtime_import']:.2f}s, "
+                f"backend {t['backend']:.2f}s, model {t['model']:.2f}s, first frame {t['first_frame']:.2f}s)")
+
+    def _frame_shape(self):
+        if self.codec == "yuv420":
+            return (self.h, self.w * len(self.region_names), 3)
+        x0, y0, x1, y1 = self.roi
+        return (-(-(y1 - y0) // self.decode_scale), -(-(x1 - x0) // self.decode_scale), 3)
+
+    def _model_view(self, frame):
+        # Only ROI pixels are resized and normalized; the slice is a view.
+        if self.codec == "yuv420":
+            return frame
+        x0, y0, x1, y1 = (v // self.decode_scale for v in self.roi)
+        return frame[y0:y1, x0:x1]
+
+    def _publish(self, frame, raw, stamp):
+        with self.frame_cond:
+            self.latest_frame = frame
+            self.latest_raw = raw
+            self.frame_seq += 1
+            self.frame_time = stamp
+            self.frame_cond.notify_all()
+
+        if self.worker:
+            self._submit(frame, raw, stamp)
 
     def _capture_loop(self):
-        stream_buffer = b""
+        if self.codec == "yuv420":
+            self._capture_yuv()
+        else:
+            self._capture_mjpeg()
+
+    def _capture_mjpeg(self):
+        stream = MJPEGStream(self.stream)
         while self.running:
             try:
-                chunk = self.process.stdout.read(4096)
-                if not chunk: break
-                stream_buffer += chunk
-                
-                a = stream_buffer.find(b'\xff\xd8')
-                b = stream_buffer.find(b'\xff\xd9')
-                
-                if a != -1 and b != -1:
-                    jpg = stream_buffer[a:b+2]
-                    stream_buffer = stream_buffer[b+2:]
-                    frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    if frame is not None:
-                        self.latest_frame = frame
+                jpg = stream.read(latest=True)
+                if jpg is None: break
+                stamp = time.monotonic()
+
+                frame = decode_jpeg(jpg, self.decode_flags)
+                if frame is not None:
+                    # Reduced frames only feed the model; the preview decodes
+                    # the full-resolution JPEG when a result is drawn.
+                    raw = bytes(jpg) if self.preview and self.decode_scale > 1 else None
+                    self._publish(frame, raw, stamp)
             except Exception:
                 time.sleep(0.1)
 
-    def _inference(self, img):
-        img_resized = cv2.resize(img, (self.w, self.h))
-        input_data = np.expand_dims(img_resized, axis=0)
-        
-        if self.is_float:
-            input_data = (np.float32(input_data) / 127.5) - 1.0
+    def _capture_yuv(self):
+        stream = YUV420Stream(self.stream, self.cam_w, self.cam_h)
+        count = len(self.region_names)
+        x0, y0, x1, y1 = self.roi
+        w_step = (x1 - x0) // count
+        while self.running:
+            try:
+                if stream.read() is None: break
+                stamp = time.monotonic()
 
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-        self.interpreter.invoke()
-        output = self.interpreter.get_tensor(self.output_details[0]['index'])
-        pred = np.squeeze(output)
-        
-        return pred[self.target_idx] if self.is_float else pred[self.target_idx] / 255.0
+                # The published frame is the model-sized region crops side by
+                # side, so split_regions hands the scorer exactly these pixels.
+                frame = np.empty(self._frame_shape(), np.uint8)
+                for i in range(count):
+                    left = x0 + i * w_step
+                    right = x1 if i == count - 1 else left + w_step
+                    frame[:, i*self.w:(i+1)*self.w] = stream.crop_bgr(left, right, (self.w, self.h), y0, y1)
+
+                raw = stream.buffer.copy() if self.preview else None
+                self._publish(frame, raw, stamp)
+            except Exception:
+                time.sleep(0.1)
+
+    def _decode_preview(self, raw):
+        if self.codec == "yuv420":
+            return cv2.cvtColor(raw.reshape(self.cam_h * 3 // 2, self.cam_w), cv2.COLOR_YUV2BGR_I420)
+        return decode_jpeg(raw)
+
+    def _submit(self, frame, raw, stamp):
+        # Held across the copy so the ring cannot be released underneath it
+        # when a dead worker is replaced.
+        with self.frame_cond:
+            if self.worker is None:
+                return
+            seq = self.frame_seq
+            self.pending[seq] = (frame, raw, stamp)
+            if not self.worker.submit(self._model_view(frame), seq):
+                del self.pending[seq]
+
+    def _result_loop(self):
+        worker = self.worker
+        while self.running:
+            try:
+                seq, preds, steering, stats = worker.collect(timeout=0.5)
+            except (queue.Empty, EOFError, OSError):
+                if not worker.process.is_alive():
+                    with self.frame_cond:
+                        self.worker_lost = True
+                        self.frame_cond.notify_all()
+                    return
+                continue
+
+            with self.frame_cond:
+                self.worker_stats = stats
+                frame, raw, stamp = self.pending.pop(seq)
+                self.worker_result = (seq, stamp, frame, raw, dict(zip(self.region_names, preds)), steering)
+                self.frame_cond.notify_all()
+
+    def _replace_worker(self):
+        # Serving the last result from a dead worker would keep the robot
+        # steering on it, so inference moves into this process instead. If
+        # that fails too, the error reaches the caller.
+        print(f"Inference worker died (exit code {self.worker.process.exitcode}), using in-process inference")
+        self.scorer = create_scorer(self.backend, **self.scorer_options)
+
+        with self.frame_cond:
+            worker, self.worker = self.worker, None
+            self.pending.clear()
+            self.worker_result = None
+            self.worker_lost = False
+        self.result_thread.join()
+        worker.close()
+
+    def _ready_seq(self):
+        if self.worker_lost:
+            return -1
+        if self.worker:
+            return self.worker_result[0] if self.worker_result else 0
+        return self.frame_seq
+
+    def wait_for_frame(self, timeout=None):
+        with self.frame_cond:
+            return self.frame_cond.wait_for(lambda: self._ready_seq() != self.last_seq, timeout)
+
+    def stats(self):
+        if self.worker:
+            with self.frame_cond:
+                return dict(self.worker_stats)
+        return self.scorer.stats()
+
+    def _cached_result(self):
+        result, best_score, scores = self.last_result
+        frame = None if self.headless else self.render_overlay()
+        return result, best_score, frame, scores
+
+    def render_overlay(self):
+        if self.last_result is None:
+            return np.zeros((self.cam_h, self.cam_w, 3), np.uint8)
+
+        if self.overlay_seq != self.last_seq:
+            latest, raw = self.last_source
+            frame = self._decode_preview(raw) if raw is not None else None
+            if frame is None and self.codec == "yuv420":
+                # Without the raw frame only the region mosaic is left to draw on.
+                frame = latest.copy()
+                box = (0, 0, frame.shape[1], frame.shape[0])
+            else:
+                if frame is None:
+                    frame = latest.copy()
+                sx, sy = frame.shape[1] / self.cam_w, frame.shape[0] / self.cam_h
+                x0, y0, x1, y1 = self.roi
+                box = (int(x0 * sx), int(y0 * sy), int(x1 * sx), int(y1 * sy))
+            self._draw_overlay(frame, self.last_result[2], self.last_result[0], box, self.steering)
+            self.overlay = frame
+            self.overlay_seq = self.last_seq
+
+        return self.overlay.copy()
 
     def process_frame(self):
-        if self.latest_frame is None:
-            return "None", 0.0, np.zeros((240, 640, 3), np.uint8)
+        if self.worker and not self.worker.process.is_alive():
+            self._replace_worker()
 
-        frame = self.latest_frame.copy()
-        h, width, _ = frame.shape
-        w_step = width // 3
+        with self.frame_cond:
+            if self.worker:
+                ready = self.worker_result or (0, 0.0, None, None, None, None)
+            else:
+                ready = (self.frame_seq, self.frame_time, self.latest_frame, self.latest_raw, None, None)
+        seq, stamp, latest, raw, scores, steering = ready
 
-        regions = {
-            "Left": frame[:, :w_step],
-            "Center": frame[:, w_step:w_step*2],
-            "Right": frame[:, w_step*2:]
-        }
+        if latest is None:
+            return "None", 0.0, None if self.headless else np.zeros((self.cam_h, self.cam_w, 3), np.uint8), {}
+
+        if seq == self.last_seq:
+            return self._cached_result()
+
+        if scores is None:
+            preds, steering = self.scorer.score_frame(self._model_view(latest))
+            scores = dict(zip(self.region_names, preds))
 
-        scores = {k: self._inference(v) for k, v in regions.items()}
         best_dir = max(scores, key=scores.get)
         best_score = scores[best_dir]
         
         result = best_dir if best_score > self.threshold else "None"
 
-        cv2.line(frame, (w_step, 0), (w_step, h), (255, 255, 255), 2)
-        cv2.line(frame, (w_step*2, 0), (w_step*2, h), (255, 255, 255), 2)
+        self.last_seq = seq
+        self.last_frame_time = stamp
+        self.last_result = (result, best_score, scores)
+        self.steering = steering
+        self.last_source = (latest, raw)
+        return self._cached_result()
+
+    def _draw_overlay(self, frame, scores, result, box, steering=None):
+        x0, y0, x1, y1 = box
+        w_step = (x1 - x0) // 3
+
+        if box != (0, 0, frame.shape[1], frame.shape[0]):
+            cv2.rectangle(frame, (x0, y0), (x1, y1), (0, 0, 255), 2)
+
+        cv2.line(frame, (x0+w_step, y0), (x0+w_step, y1), (255, 255, 255), 2)
+        cv2.line(frame, (x0+w_step*2, y0), (x0+w_step*2, y1), (255, 255, 255), 2)
         
-        cv2.putText(frame, f"L:{scores['Left']:.2f}", (10, h-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, f"C:{scores['Center']:.2f}", (w_step+10, h-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, f"R:{scores['Right']:.2f}", (w_step*2+10, h-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"L:{scores['Left']:.2f}", (x0+10, y1-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"C:{scores['Center']:.2f}", (x0+w_step+10, y1-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"R:{scores['Right']:.2f}", (x0+w_step*2+10, y1-20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
         if result == "Left":
-            cv2.rectangle(frame, (0,0), (w_step, h), (0,255,0), 3)
+            cv2.rectangle(frame, (x0,y0), (x0+w_step, y1), (0,255,0), 3)
         elif result == "Center":
-            cv2.rectangle(frame, (w_step,0), (w_step*2, h), (0,255,0), 3)
+            cv2.rectangle(frame, (x0+w_step,y0), (x0+w_step*2, y1), (0,255,0), 3)
         elif result == "Right":
-            cv2.rectangle(frame, (w_step*2,0), (width, h), (0,255,0), 3)
-        
-        return result, best_score, frame, scores
+            cv2.rectangle(frame, (x0+w_step*2,y0), (x1, y1), (0,255,0), 3)
+
+        if steering is not None:
+            x = int(x0 + (steering + 1.0) / 2.0 * (x1 - x0))
+            cv2.line(frame, (x, y0), (x, y1), (0, 255, 255), 2)
 
     def close(self):
         self.running = False
         if self.thread.is_alive():
             self.thread.join()
 
+        if self.worker:
+            if self.result_thread.is_alive():
+                self.result_thread.join()
+            self.worker.close()
+
         if self.process:
             self.process.terminate()
+        else:
+            self.stream.close()
 
-        self.interpreter = None
\ No newline at end of file
+        if self.scorer:
+            self.scorer.close()
\ No newline at end of file
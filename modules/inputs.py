@@ -1,30 +1,65 @@
 import RPi.GPIO as GPIO
+import threading
 import time
 
 class Button:
-    def __init__(self, pin):
+    def __init__(self, pin, events=None, name="button", debounce=0.3):
         self.pin = pin
         self.last_state = 1
         self.last_time = 0
+        self.events = events
+        self.name = name
+        self.debounce = debounce
+        self.pressed = False
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
+        # With an event queue, presses are caught by an edge callback however
+        # long the caller takes between checks.
+        if events is not None:
+            GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self._on_edge)
+
+    def _on_edge(self, channel):
+        # A press counts only after the button sat released for the debounce
+        # time, so contact bounce on either press or release (however long
+        # the button was held) cannot toggle again.
+        now = time.monotonic()
+        state = GPIO.input(self.pin)
+        stable = now - self.last_time > self.debounce
+        self.last_time = now
+        if state == self.last_state:
+            return
+
+        self.last_state = state
+        if state == 0 and stable:
+            self.pressed = True
+            self.events.put((self.name, True, now))
+
     def is_pressed(self):
+        if self.events is not None:
+            detected, self.pressed = self.pressed, False
+            return detected
+
         state = GPIO.input(self.pin)
         detected = False
         
         if self.last_state == 1 and state == 0:
-            if time.time() - self.last_time > 0.3:
+            now = time.monotonic()
+            if now - self.last_time > self.debounce:
                 detected = True
-                self.last_time = time.time()
+                self.last_time = now
         
         self.last_state = state
         return detected
 
 class UltrasonicSensor:
-    def __init__(self, trig_pin, echo_pin):
+    def __init__(self, trig_pin, echo_pin, interrupt=False, timeout=0.04, max_age=0.5, start_window=0.01):
         self.trig = trig_pin
         self.echo = echo_pin
+        self.interrupt = interrupt
+        self.timeout = timeout
+        self.max_age = max_age
+        self.start_window = start_window
         
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.trig, GPIO.OUT)
@@ -32,7 +67,72 @@ class UltrasonicSensor:
         GPIO.output(self.trig, False)
         time.sleep(0.1)
 
+        self.reading = (-1, 0.0)
+        self.pending = False
+        self.trigger_time = 0.0
+        self.trigger_ns = 0
+        self.echo_start = None
+        self.timeouts = 0
+        self.done = threading.Event()
+
+        # In interrupt mode the echo pulse is timed from edge callbacks, so
+        # no thread spins on GPIO.input while the ping is in flight.
+        if interrupt:
+            GPIO.add_event_detect(self.echo, GPIO.BOTH, callback=self._on_echo)
+
+    def _on_echo(self, channel):
+        now = time.perf_counter_ns()
+        if not self.pending:
+            return
+
+        # The callback can run after a short echo pulse has already ended,
+        # so the level is not read back: the first edge after the trigger is
+        # the start and the next one the end. An edge leftover from an
+        # earlier ping shows up too late to be a start, and drops the ping.
+        if self.echo_start is None:
+            if (now - self.trigger_ns) / 1e9 > self.start_window:
+                self.pending = False
+                self.done.set()
+                return
+            self.echo_start = now
+            return
+
+        elapsed = (now - self.echo_start) / 1e9
+        self.pending = False
+        if elapsed <= self.timeout:
+            self.reading = ((elapsed * 34300) / 2, time.monotonic())
+        self.done.set()
+
+    def trigger(self):
+        self.echo_start = None
+        self.done.clear()
+        self.pending = True
+        self.trigger_time = time.monotonic()
+        self.trigger_ns = time.perf_counter_ns()
+
+        GPIO.output(self.trig, True)
+        time.sleep(0.00001)
+        GPIO.output(self.trig, False)
+
     def get_distance(self):
+        if not self.interrupt:
+            return self._measure()
+
+        now = time.monotonic()
+        if self.pending and now - self.trigger_time > self.timeout:
+            self.timeouts += 1
+            self.pending = False
+        if not self.pending:
+            self.trigger()
+
+        distance, stamp = self.reading
+        return distance if now - stamp <= self.max_age else -1
+
+    def cleanup(self):
+        if self.interrupt:
+            GPIO.remove_event_detect(self.echo)
+
+    def _measure(self):
         GPIO.output(self.trig, True)
         time.sleep(0.00001)
         GPIO.output(self.trig, False)
@@ -53,10 +153,232 @@ class UltrasonicSensor:
         return (elapsed * 34300) / 2
 
 class PIRSensor:
-    def __init__(self, pin):
+    def __init__(self, pin, events=None, name="motion", debounce=0.05):
         self.pin = pin
+        self.events = events
+        self.name = name
+        self.debounce = debounce
         GPIO.setmode(GPIO.BCM)
         GPIO.setup(self.pin, GPIO.IN)
 
+        self.active = GPIO.input(self.pin) == 1
+        self.last_time = 0
+        self.lock = threading.Lock()
+        self.recheck = None
+        if events is not None:
+            GPIO.add_event_detect(self.pin, GPIO.BOTH, callback=self._on_edge)
+
+    def _on_edge(self, channel, recheck=False):
+        with self.lock:
+            if recheck:
+                self.recheck = None
+            now = time.monotonic()
+
+            # An edge inside the debounce window may still be a real change,
+            # so the pin is read again once the window has passed.
+            wait = self.last_time + self.debounce - now
+            if wait > 0:
+                if self.recheck is None:
+                    self.recheck = threading.Timer(wait, self._on_edge, (channel, True))
+                    self.recheck.daemon = True
+                    self.recheck.start()
+                return
+
+            active = GPIO.input(self.pin) == 1
+            if active == self.active:
+                return
+
+            self.active = active
+            self.last_time = now
+            self.events.put((self.name, active, now))
+
     def is_active(self):
-        return GPIO.input(self.pin) == 1
\ No newline at end of file
+        if self.events is not None:
+            return self.active
+        return GPIO.input(self.pin) == 1
+
+class SampleChannel:
+    def __init__(self, read, rate, window=5, alpha=0.3, valid=None):
+        self.read = read
+        self.period = 1.0 / rate if rate else None
+        self.alpha = alpha
+        self.valid = valid
+
+        self.ring = [None] * window
+        self.index = 0
+        self.ema = None
+        self.samples = 0
+        self.rejected = 0
+
+        # (raw, median, ema, stamp), replaced whole so readers never lock.
+        self.reading = None
+
+    def sample(self):
+        self.push(self.read())
+
+    def push(self, value, stamp=None):
+        stamp = time.monotonic() if stamp is None else stamp
+        if self.valid and not self.valid(value):
+            self.rejected += 1
+            return
+
+        self.ring[self.index] = value
+        self.index = (self.index + 1) % len(self.ring)
+        self.ema = value if self.ema is None else self.alpha * value + (1 - self.alpha) * self.ema
+        self.samples += 1
+
+        values = sorted(v for v in self.ring if v is not None)
+        self.reading = (value, values[len(values) // 2], self.ema, stamp)
+
+class SensorSampler:
+    def __init__(self):
+        self.channels = {}
+        self.threads = []
+        self.running = False
+
+    def add(self, name, read, rate, window=5, alpha=0.3, valid=None):
+        # read=None makes a channel fed through push(), e.g. by a scheduler
+        # that owns the sensor's timing.
+        self.channels[name] = SampleChannel(read, rate, window, alpha, valid)
+
+    def push(self, name, value, stamp=None):
+        self.channels[name].push(value, stamp)
+
+    def start(self):
+        self.running = True
+        for channel in self.channels.values():
+            if channel.read is None:
+                continue
+            thread = threading.Thread(target=self._sample_loop, args=(channel,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _sample_loop(self, channel):
+        next_time = time.monotonic()
+        while self.running:
+            try:
+                channel.sample()
+            except Exception:
+                pass
+
+            next_time += channel.period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def _value(self, name, field, max_age, default):
+        reading = self.channels[name].reading
+        if reading is None or (max_age is not None and time.monotonic() - reading[3] > max_age):
+            return default
+        return reading[field]
+
+    def raw(self, name, max_age=None, default=-1):
+        return self._value(name, 0, max_age, default)
+
+    def median(self, name, max_age=None, default=-1):
+        return self._value(name, 1, max_age, default)
+
+    def ema(self, name, max_age=None, default=-1):
+        return self._value(name, 2, max_age, default)
+
+    def age(self, name):
+        reading = self.channels[name].reading
+        return float('inf') if reading is None else time.monotonic() - reading[3]
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+class UltrasonicScheduler:
+    def __init__(self, on_reading=None, timeout=0.04, guard=0.01):
+        self.on_reading = on_reading
+        self.timeout = timeout
+        self.guard = guard
+
+        self.entries = []
+        self.group_free = {}
+        self.readings = {}
+        self.running = False
+        self.thread = None
+
+    def add(self, name, sensor, rate, priority=0, group=None):
+        # Sensors sharing a group can hear each other's pings and are never
+        # in flight together; sensors in different groups fire in the same
+        # window. Without a group a sensor is assumed to be isolated.
+        if not sensor.interrupt:
+            raise ValueError(f"{name}: UltrasonicScheduler needs a sensor in interrupt mode")
+        self.entries.append({
+            "name": name, "sensor": sensor, "period": 1.0 / rate, "priority": priority,
+            "group": name if group is None else group, "next_due": 0.0
+        })
+
+    def _select(self, now):
+        due = [e for e in self.entries if e["next_due"] <= now and self.group_free.get(e["group"], 0.0) <= now]
+        due.sort(key=lambda e: (-e["priority"], e["next_due"]))
+
+        batch, groups = [], set()
+        for entry in due:
+            if entry["group"] not in groups:
+                batch.append(entry)
+                groups.add(entry["group"])
+        return batch
+
+    def _fire(self, batch):
+        start = time.monotonic()
+        for entry in batch:
+            entry["sensor"].trigger()
+
+        deadline = start + self.timeout
+        for entry in batch:
+            entry["sensor"].done.wait(max(deadline - time.monotonic(), 0.0))
+
+        finish = time.monotonic()
+        for entry in batch:
+            sensor = entry["sensor"]
+            distance, stamp = sensor.reading
+            if sensor.pending:
+                sensor.pending = False
+                sensor.timeouts += 1
+            if stamp < start:
+                distance, stamp = -1, finish
+
+            self.readings[entry["name"]] = (distance, stamp)
+            if self.on_reading:
+                self.on_reading(entry["name"], distance, stamp)
+
+            # Echoes from this ping may still be ringing, so the group waits
+            # out a guard time; the cadence itself stays on absolute deadlines.
+            self.group_free[entry["group"]] = finish + self.guard
+            entry["next_due"] = max(entry["next_due"] + entry["period"], finish)
+
+    def _run(self):
+        now = time.monotonic()
+        for entry in self.entries:
+            entry["next_due"] = now
+
+        while self.running:
+            now = time.monotonic()
+            batch = self._select(now)
+            if batch:
+                self._fire(batch)
+                continue
+
+            wake = min(max(e["next_due"], self.group_free.get(e["group"], 0.0)) for e in self.entries)
+            time.sleep(min(max(wake - now, 0.001), 0.1))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def get_distance(self, name):
+        return self.readings.get(name, (-1, 0.0))[0]
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
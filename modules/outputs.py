@@ -1,5 +1,6 @@
 import RPi.GPIO as GPIO
 import smbus
+import threading
 import time
 
 class LED:
@@ -42,6 +43,7 @@ class LCD:
     def __init__(self, i2c_addr=0x27, bus=1):
         self.addr = i2c_addr
         self.bus = smbus.SMBus(bus)
+        self.lock = threading.Lock()
         self.init_display()
 
     def _write_byte(self, bits, mode):
@@ -71,9 +73,12 @@ class LCD:
 
     def write_text(self, message, line):
         message = str(message).ljust(16, " ")
-        self._write_byte(0x80 if line == 1 else 0xC0, 0)
-        for char in message:
-            self._write_byte(ord(char), 1)
+        # Lines are written from executor threads; keep each one whole.
+        with self.lock:
+            self._write_byte(0x80 if line == 1 else 0xC0, 0)
+            for char in message:
+                self._write_byte(ord(char), 1)
 
     def clear(self):
-        self._write_byte(0x01, 0)
\ No newline at end of file
+        with self.lock:
+            self._write_byte(0x01, 0)
\ No newline at end of file
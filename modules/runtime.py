@@ -0,0 +1,250 @@
+import asyncio
+import queue
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+class Deadline:
+    def __init__(self, rate, history=1000):
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.next = None
+        self.last = None
+
+        self.intervals = deque(maxlen=history)
+        self.lateness = deque(maxlen=history)
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    async def wait(self):
+        # Deadlines are absolute, so time spent between calls does not add
+        # up into drift the way sleep(period) does.
+        now = time.monotonic()
+        if self.next is None:
+            self.next = now
+        else:
+            self.next += self.period
+            if now > self.next:
+                self.overruns += 1
+                behind = int((now - self.next) / self.period)
+                if behind:
+                    self.skipped += behind
+                    self.next += behind * self.period
+            else:
+                await asyncio.sleep(self.next - now)
+
+        stamp = time.monotonic()
+        if self.last is not None:
+            self.intervals.append(stamp - self.last)
+        self.lateness.append(stamp - self.next)
+        self.last = stamp
+        self.ticks += 1
+        return stamp
+
+    def stats(self):
+        intervals = list(self.intervals)
+        jitter = [abs(i - self.period) for i in intervals]
+        return {
+            "rate": self.rate,
+            "ticks": self.ticks,
+            "period_mean": sum(intervals) / len(intervals) if intervals else 0.0,
+            "jitter_p50": _percentile(jitter, 0.50),
+            "jitter_p95": _percentile(jitter, 0.95),
+            "jitter_p99": _percentile(jitter, 0.99),
+            "jitter_max": max(jitter, default=0.0),
+            "lateness_p95": _percentile(list(self.lateness), 0.95),
+            "overruns": self.overruns,
+            "skipped": self.skipped
+        }
+
+class Runtime:
+    def __init__(self, workers=4):
+        self.executor = ThreadPoolExecutor(workers)
+        self.serial = ThreadPoolExecutor(1)
+        self.sources = []
+        self.inputs = []
+        self.timers = {}
+        self.readings = {}
+        self.events = None
+        self.loop = None
+
+    def poll(self, name, read, rate=None, blocking=False, when=None, changes=False):
+        # rate=None polls back to back, for readers that already wait, like
+        # Vision.wait_for_frame.
+        self.sources.append((name, read, rate, blocking, when, changes))
+
+    def listen(self, events):
+        # Thread-safe queues filled by GPIO callbacks and the like; they are
+        # merged into the events handed out by drain().
+        self.inputs.append(events)
+
+    def deadline(self, name, rate):
+        timer = Deadline(rate)
+        self.timers[name] = timer
+        return timer
+
+    def stats(self):
+        return {name: timer.stats() for name, timer in self.timers.items()}
+
+    def report(self):
+        lines = []
+        for name, s in self.stats().items():
+            lines.append(f"{name}: {s['rate']:g}Hz period {s['period_mean']*1000:.1f}ms | jitter p50 "
+                         f"{s['jitter_p50']*1000:.2f}ms p95 {s['jitter_p95']*1000:.2f}ms p99 "
+                         f"{s['jitter_p99']*1000:.2f}ms max {s['jitter_max']*1000:.2f}ms | "
+                         f"overruns {s['overruns']} skipped {s['skipped']}")
+        return "\n".join(lines)
+
+    def latest(self, name, default=None):
+        return self.readings.get(name, (default, 0.0))[0]
+
+    async def call(self, func, *args):
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    def post(self, func, *args):
+        # Fire-and-forget output (LCD text and the like), applied in order on
+        # one thread so the control tick never waits for it.
+        return self.serial.submit(func, *args)
+
+    async def _poll(self, name, read, rate, blocking, when, changes):
+        timer = self.deadline(name, rate) if rate else None
+        while True:
+            if timer:
+                await timer.wait()
+            else:
+                await asyncio.sleep(0)
+
+            value = await self.call(read) if blocking else read()
+            stamp = time.monotonic()
+
+            previous = self.readings.get(name, (None, 0.0))[0]
+            self.readings[name] = (value, stamp)
+            if (when is None or when(value)) and not (changes and value == previous):
+                self.events.put_nowait((name, value, stamp))
+
+    def drain(self):
+        # Everything queued since the last tick is handed over at once, so
+        # decisions use the newest readings instead of replaying old ones.
+        events = []
+        for source in self.inputs:
+            try:
+                while True:
+                    events.append(source.get_nowait())
+            except queue.Empty:
+                pass
+        while not self.events.empty():
+            events.append(self.events.get_nowait())
+        return events
+
+    async def _main(self, control):
+        self.loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+        # kill -USR1 <pid> prints timing statistics without stopping the run.
+        self.loop.add_signal_handler(signal.SIGUSR1, lambda: print(self.report()))
+        tasks = [asyncio.create_task(self._poll(*source)) for source in self.sources]
+        tasks.append(asyncio.create_task(control))
+        try:
+            # A failing device task ends the run just like the control loop
+            # returning does.
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, control):
+        try:
+            asyncio.run(self._main(control))
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.serial.shutdown(wait=False, cancel_futures=True)
+
+class ActionScheduler:
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.task = None
+        self.name = None
+        self.started = 0.0
+        self.interrupted = set()
+        self.cancelling = set()
+
+    def busy(self, name=None):
+        running = self.task is not None and not self.task.done()
+        return running and (name is None or name == self.name)
+
+    def start(self, name, steps, cleanup=()):
+        # Steps are waits in seconds or (func, *args) calls; coroutine
+        # functions are awaited, anything else runs in the executor. A new
+        # action takes the hardware over as it is, so the one it replaces
+        # skips its cleanup.
+        previous = self.cancel(cleanup=False)
+        self.name = name
+        self.started = time.monotonic()
+        self.task = asyncio.create_task(self._run(previous, steps, cleanup))
+
+    def cancel(self, cleanup=True):
+        # The task stays current until its cleanup has finished, so busy()
+        # reports it and the next start() waits for it.
+        task = self.task
+        if task is not None and not task.done() and task not in self.cancelling:
+            if cleanup:
+                self.interrupted.add(task)
+            self.cancelling.add(task)
+            task.cancel()
+        return task
+
+    async def _step(self, step):
+        if isinstance(step, (int, float)):
+            await asyncio.sleep(step)
+            return
+
+        func, *args = step
+        if asyncio.iscoroutinefunction(func):
+            await func(*args)
+            return
+
+        # A hardware call cannot be interrupted halfway, so a cancelled
+        # action still waits for it before letting anything else move.
+        future = self.runtime.loop.run_in_executor(self.runtime.executor, func, *args)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Further cancellations (shutdown cancels every task) must not cut
+            # this wait short either.
+            while not future.done():
+                try:
+                    await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    async def _run(self, previous, steps, cleanup):
+        if previous is not None:
+            try:
+                await asyncio.wait([previous])
+            except asyncio.CancelledError:
+                await asyncio.wait([previous])
+                raise
+
+        task = asyncio.current_task()
+        try:
+            for step in steps:
+                await self._step(step)
+        except asyncio.CancelledError:
+            if task in self.interrupted:
+                for step in cleanup:
+                    await self._step(step)
+            raise
+        finally:
+            self.interrupted.discard(task)
+            self.cancelling.discard(task)
@@ -0,0 +1,187 @@
+import cv2
+import numpy as np
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+def decode_jpeg(jpg, flags=cv2.IMREAD_COLOR):
+    return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), flags)
+
+def select_decode_scale(frame_w, frame_h, region_w, region_h, columns=1):
+    # Largest JPEG DCT scale whose regions still cover the model input.
+    for scale in (8, 4, 2):
+        if (frame_w // scale) // columns >= region_w and frame_h // scale >= region_h:
+            return scale
+    return 1
+
+class MJPEGStream:
+    def __init__(self, stream, buffer_size=1 << 20, read_size=65536):
+        self.stream = stream
+        self.read_size = read_size
+        self._readinto = getattr(stream, "readinto1", stream.readinto)
+        self._allocate(buffer_size)
+
+        self.start = 0
+        self.end = 0
+        self.scan = 0
+        self.frame_start = -1
+
+        self.frames = 0
+        self.dropped = 0
+        self.eof = False
+
+    def _allocate(self, size, keep=0):
+        buffer = bytearray(size)
+        if keep:
+            buffer[:keep] = self.view[:keep]
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.array = np.frombuffer(buffer, dtype=np.uint8)
+
+    def _compact(self):
+        # Frames are handed out as views into the buffer, so data is only
+        # moved here, right before the next read overwrites it.
+        if self.start > 0:
+            size = self.end - self.start
+            self.array[:size] = self.array[self.start:self.end]
+            self.scan -= self.start
+            if self.frame_start != -1:
+                self.frame_start -= self.start
+            self.start = 0
+            self.end = size
+
+        if self.end == len(self.buffer):
+            self._allocate(len(self.buffer) * 2, keep=self.end)
+
+    def _fill(self):
+        if len(self.buffer) - self.end < self.read_size:
+            self._compact()
+
+        free = min(len(self.buffer) - self.end, self.read_size)
+        n = self._readinto(self.view[self.end:self.end + free])
+        if not n:
+            self.eof = True
+            return 0
+
+        self.end += n
+        return n
+
+    def _next_frame(self):
+        buf = self.buffer
+        if self.frame_start == -1:
+            a = buf.find(SOI, self.scan, self.end)
+            if a == -1:
+                # Keep the last byte, it may be the first half of a marker.
+                self.start = self.scan = max(self.start, self.end - 1)
+                return None
+            self.start = self.frame_start = a
+            self.scan = a + 2
+
+        b = buf.find(EOI, self.scan, self.end)
+        if b == -1:
+            self.scan = max(self.scan, self.end - 1)
+            return None
+
+        frame = (self.frame_start, b + 2)
+        self.frame_start = -1
+        self.start = self.scan = b + 2
+        return frame
+
+    def read(self, latest=False):
+        frame = self._next_frame()
+        while frame is None:
+            if not self._fill():
+                return None
+            frame = self._next_frame()
+
+        if latest:
+            newer = self._next_frame()
+            while newer is not None:
+                self.dropped += 1
+                frame, newer = newer, self._next_frame()
+
+        self.frames += 1
+        return self.view[frame[0]:frame[1]]
+
+    def read_frame(self, flags=cv2.IMREAD_COLOR, latest=False):
+        while True:
+            jpg = self.read(latest=latest)
+            if jpg is None:
+                return None
+            frame = decode_jpeg(jpg, flags)
+            if frame is not None:
+                return frame
+
+    def __iter__(self):
+        while True:
+            jpg = self.read()
+            if jpg is None:
+                return
+            yield jpg
+
+class YUV420Stream:
+    def __init__(self, stream, width, height):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self._readinto = getattr(stream, "readinto1", stream.readinto)
+
+        y_size = width * height
+        c_size = (width // 2) * (height // 2)
+        self.frame_size = y_size + 2 * c_size
+        self.buffer = np.empty(self.frame_size, np.uint8)
+        self.view = memoryview(self.buffer)
+
+        self.y = self.buffer[:y_size].reshape(height, width)
+        self.u = self.buffer[y_size:y_size + c_size].reshape(height // 2, width // 2)
+        self.v = self.buffer[y_size + c_size:].reshape(height // 2, width // 2)
+
+        self.crop_buffers = {}
+        self.frames = 0
+        self.eof = False
+
+    def read(self):
+        filled = 0
+        while filled < self.frame_size:
+            n = self._readinto(self.view[filled:])
+            if not n:
+                self.eof = True
+                return None
+            filled += n
+
+        self.frames += 1
+        return self.y, self.u, self.v
+
+    def _crop_buffer(self, size):
+        if size not in self.crop_buffers:
+            w, h = size
+            buffer = np.empty(w * h * 3 // 2, np.uint8)
+            y = buffer[:w*h].reshape(h, w)
+            u = buffer[w*h:w*h + (w//2)*(h//2)].reshape(h // 2, w // 2)
+            v = buffer[w*h + (w//2)*(h//2):].reshape(h // 2, w // 2)
+            bgr = np.empty((h, w, 3), np.uint8)
+            self.crop_buffers[size] = (buffer.reshape(h * 3 // 2, w), y, u, v, bgr)
+        return self.crop_buffers[size]
+
+    def crop_bgr(self, x0, x1, size=None, y0=0, y1=None):
+        # Planes are scaled before conversion, so only the pixels the model
+        # sees are ever converted to BGR.
+        y1 = self.height if y1 is None else y1
+        size = size or (x1 - x0, y1 - y0)
+        i420, y, u, v, bgr = self._crop_buffer(size)
+
+        cv2.resize(self.y[y0:y1, x0:x1], size, dst=y)
+        cv2.resize(self.u[y0//2:y1//2, x0//2:x1//2], (size[0] // 2, size[1] // 2), dst=u)
+        cv2.resize(self.v[y0//2:y1//2, x0//2:x1//2], (size[0] // 2, size[1] // 2), dst=v)
+        return cv2.cvtColor(i420, cv2.COLOR_YUV2BGR_I420, dst=bgr)
+
+    def to_bgr(self, raw=None):
+        raw = self.buffer if raw is None else raw
+        return cv2.cvtColor(raw.reshape(self.height * 3 // 2, self.width), cv2.COLOR_YUV2BGR_I420)
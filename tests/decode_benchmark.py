@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.inferences import BACKENDS, RegionScorer, split_regions
+from modules.streams import DECODE_FLAGS, MJPEGStream, decode_jpeg
+
+RECORDING = sys.argv[1] if len(sys.argv) > 1 else "recording.mjpeg"
+MODEL_PATH = sys.argv[2] if len(sys.argv) > 2 else "model/model_unquant.tflite"
+BACKEND = sys.argv[3] if len(sys.argv) > 3 else "cpu-float"
+REGIONS = 3
+
+# Scoring goes through RegionScorer, so resizing and normalization are the
+# same code the robot runs.
+scorer = RegionScorer(BACKENDS[BACKEND](MODEL_PATH, 1), REGIONS)
+model_h, model_w = scorer.h, scorer.w
+
+with open(RECORDING, 'rb') as f:
+    jpegs = [bytes(jpg) for jpg in MJPEGStream(f)]
+print(f"{len(jpegs)} frames, model input {model_w}x{model_h}")
+
+reference = None
+for scale, flags in DECODE_FLAGS.items():
+    prep_time = 0.0
+    score_time = 0.0
+    scores = []
+    for jpg in jpegs:
+        start = time.perf_counter()
+        frame = decode_jpeg(jpg, flags)
+        prep_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores.append(scorer.score(split_regions(frame, REGIONS)))
+        score_time += time.perf_counter() - start
+
+    scores = np.array(scores)
+    if reference is None:
+        reference = scores
+
+    size = f"{frame.shape[1]}x{frame.shape[0]}"
+    diff = np.abs(scores - reference).max()
+    agree = np.mean(scores.argmax(axis=1) == reference.argmax(axis=1)) * 100
+    print(f"1/{scale} ({size}): decode {prep_time / len(jpegs) * 1000:.2f}ms/frame "
+          f"score {score_time / len(jpegs) * 1000:.2f}ms/frame | "
+          f"L:{scores[:, 0].mean():.3f} C:{scores[:, 1].mean():.3f} R:{scores[:, 2].mean():.3f} | "
+          f"max diff {diff:.3f} | best region agrees {agree:.1f}%")
+
+scorer.close()
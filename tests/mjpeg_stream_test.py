@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.streams import MJPEGStream, decode_jpeg
+
+# Record a clip first:
+# rpicam-vid -t 10000 --width 640 --height 240 --codec mjpeg --nopreview -o recording.mjpeg
+RECORDING = sys.argv[1] if len(sys.argv) > 1 else "recording.mjpeg"
+CHUNK_SIZE = 4096
+
+def read_legacy(path):
+    frames = []
+    byte_buffer = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk: break
+            byte_buffer += chunk
+
+            a = byte_buffer.find(b'\xff\xd8')
+            b = byte_buffer.find(b'\xff\xd9')
+
+            if a != -1 and b != -1:
+                frames.append(byte_buffer[a:b+2])
+                byte_buffer = byte_buffer[b+2:]
+    return frames
+
+def read_stream(path):
+    with open(path, 'rb') as f:
+        return [bytes(jpg) for jpg in MJPEGStream(f)]
+
+try:
+    start = time.perf_counter()
+    legacy = read_legacy(RECORDING)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    frames = read_stream(RECORDING)
+    stream_time = time.perf_counter() - start
+
+    print(f"Legacy: {len(legacy)} frames in {legacy_time*1000:.1f}ms")
+    print(f"Stream: {len(frames)} frames in {stream_time*1000:.1f}ms")
+
+    # The legacy parser can swallow a frame when two arrive in one chunk.
+    assert set(legacy) <= set(frames), "Frame mismatch"
+
+    with open(RECORDING, 'rb') as f:
+        stream = MJPEGStream(f, buffer_size=4096, read_size=1024)
+        decoded = 0
+        for jpg in stream:
+            if decode_jpeg(jpg) is not None:
+                decoded += 1
+    assert decoded == len(frames), "Small buffer lost frames"
+
+    with open(RECORDING, 'rb') as f:
+        stream = MJPEGStream(f)
+        while stream.read(latest=True) is not None:
+            pass
+    assert stream.frames + stream.dropped == len(frames), "Latest mode lost frames"
+
+    print(f"Decoded: {decoded} | Latest mode kept {stream.frames}, dropped {stream.dropped}")
+    print("OK")
+
+except FileNotFoundError:
+    print(f"Error: {RECORDING} not found")
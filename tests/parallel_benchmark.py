@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.inferences import BACKENDS, RegionScorer, split_regions
+from modules.streams import MJPEGStream, decode_jpeg
+
+BACKEND = sys.argv[1] if len(sys.argv) > 1 else "cpu-float"
+MODEL_PATH = sys.argv[2] if len(sys.argv) > 2 else "model/model_unquant.tflite"
+RECORDING = sys.argv[3] if len(sys.argv) > 3 else None
+REGIONS = 3
+RUNS = 50
+
+if RECORDING:
+    with open(RECORDING, 'rb') as f:
+        frames = [decode_jpeg(jpg) for jpg in MJPEGStream(f)][:RUNS]
+else:
+    frames = [np.random.randint(0, 256, (240, 640, 3), np.uint8) for _ in range(RUNS)]
+print(f"{len(frames)} frames, {os.cpu_count()} cores, backend {BACKEND}")
+
+def run(label, scorer):
+    scorer.score(split_regions(frames[0], REGIONS))
+
+    scores = []
+    start = time.perf_counter()
+    for frame in frames:
+        scores.append(scorer.score(split_regions(frame, REGIONS)))
+    elapsed = (time.perf_counter() - start) / len(frames)
+
+    scorer.close()
+    print(f"{label}: {elapsed * 1000:.1f}ms/frame")
+    return np.array(scores)
+
+# One thread per interpreter, so the pool is the only source of parallelism.
+backend = BACKENDS[BACKEND](MODEL_PATH, 1)
+reference = run("sequential", RegionScorer(backend, REGIONS))
+run("batched", RegionScorer(backend, REGIONS, batched=True))
+for threads in range(2, REGIONS + 1):
+    scores = run(f"pool threads={threads}", RegionScorer(backend, REGIONS, threads=threads))
+    print(f"  max diff vs sequential {np.abs(scores - reference).max():.6f}")
@@ -0,0 +1,50 @@
+import cv2
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from modules.streams import YUV420Stream
+
+# Record a clip first:
+# rpicam-vid -t 10000 --width 640 --height 240 --codec yuv420 --nopreview -o recording.yuv
+RECORDING = sys.argv[1] if len(sys.argv) > 1 else "recording.yuv"
+WIDTH, HEIGHT = 640, 240
+MODEL_SIZE = (224, 224)
+
+try:
+    frame_size = WIDTH * HEIGHT * 3 // 2
+    expected = os.path.getsize(RECORDING) // frame_size
+
+    full_time = 0.0
+    crop_time = 0.0
+    max_diff = 0.0
+    w_step = WIDTH // 3
+
+    with open(RECORDING, 'rb') as f:
+        stream = YUV420Stream(f, WIDTH, HEIGHT)
+        while stream.read() is not None:
+            start = time.perf_counter()
+            full = stream.to_bgr()
+            reference = [cv2.resize(full[:, i*w_step:(i+1)*w_step], MODEL_SIZE) for i in range(3)]
+            full_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            crops = [stream.crop_bgr(i*w_step, (i+1)*w_step, MODEL_SIZE).copy() for i in range(3)]
+            crop_time += time.perf_counter() - start
+
+            for crop, ref in zip(crops, reference):
+                max_diff = max(max_diff, np.abs(crop.astype(np.int16) - ref).mean())
+
+    assert stream.frames == expected, f"Read {stream.frames} of {expected} frames"
+    assert max_diff < 4.0, f"Crop conversion differs from full conversion ({max_diff:.2f})"
+
+    print(f"Frames: {stream.frames}")
+    print(f"Full convert+resize: {full_time / stream.frames * 1000:.2f}ms/frame")
+    print(f"Crop convert:        {crop_time / stream.frames * 1000:.2f}ms/frame")
+    print(f"Mean abs diff: {max_diff:.2f}")
+    print("OK")
+
+except FileNotFoundError:
+    print(f"Error: {RECORDING} not found")